@@ -71,6 +71,7 @@ class PositionEvaluator:
         ]
         
         self.winning_lines = WinningPatterns.generate_all_winning_lines()
+        self.line_pattern_values = self.build_line_pattern_table()
     
     def evaluate_position(self, board: Board, player: int) -> int:
         """総合的な位置評価"""
@@ -91,34 +92,52 @@ class PositionEvaluator:
         return score
     
     def evaluate_winning_lines(self, board: Board, player: int) -> int:
-        """勝利ライン評価"""
+        """勝利ライン評価（占有パターン表を引くだけ）"""
         score = 0
         opponent = 3 - player
+        line_pattern_values = self.line_pattern_values
         
         for line in self.winning_lines:
-            my_count, opponent_count = self.count_line_stones(board, line, player)
-            
-            # 相手の石があるラインは評価しない
-            if opponent_count > 0:
-                # 相手の脅威を評価
-                if opponent_count == 2 and my_count == 0:
-                    score -= 50  # 相手の2石連続を警戒
-                elif opponent_count == 3 and my_count == 0:
-                    score -= 500  # 相手の3石連続は危険
-                continue
-            
-            # 自分の石のみのライン評価
-            if my_count == 1:
-                score += 1
-            elif my_count == 2:
-                score += 10  # 2石連続
-            elif my_count == 3:
-                score += 100  # 3石連続（勝利直前）
-            elif my_count == 4:
-                score += 1000  # 勝利
+            # 自分の石を下位4ビット、相手の石を上位4ビットに並べたパターン
+            pattern = 0
+            for i, (x, y, z) in enumerate(line):
+                if board[z][y][x] == player:
+                    pattern |= 1 << i
+                elif board[z][y][x] == opponent:
+                    pattern |= 16 << i
+            score += line_pattern_values[pattern]
         
         return score
     
+    @staticmethod
+    def line_value(my_count: int, opponent_count: int) -> int:
+        """1ラインの評価（重みの調整はここで行う）"""
+        # 相手の石があるラインは評価しない
+        if opponent_count > 0:
+            # 相手の脅威を評価
+            if opponent_count == 2 and my_count == 0:
+                return -50  # 相手の2石連続を警戒
+            elif opponent_count == 3 and my_count == 0:
+                return -500  # 相手の3石連続は危険
+            return 0
+        
+        # 自分の石のみのライン評価
+        if my_count == 1:
+            return 1
+        elif my_count == 2:
+            return 10  # 2石連続
+        elif my_count == 3:
+            return 100  # 3石連続（勝利直前）
+        elif my_count == 4:
+            return 1000  # 勝利
+        return 0
+    
+    @classmethod
+    def build_line_pattern_table(cls) -> List[int]:
+        """占有パターン（自分4ビット | 相手4ビット << 4）→ 評価値の256エントリ表"""
+        return [cls.line_value(bin(pattern & 0xF).count('1'), bin(pattern >> 4).count('1'))
+                for pattern in range(256)]
+    
     def evaluate_center_control(self, board: Board, player: int) -> int:
         """中心制御の評価"""
         score = 0
@@ -167,19 +186,6 @@ class PositionEvaluator:
         
         return score
     
-    def count_line_stones(self, board: Board, line: List[Tuple[int, int, int]], player: int) -> Tuple[int, int]:
-        my_count = 0
-        opponent_count = 0
-        opponent = 3 - player
-        
-        for x, y, z in line:
-            if board[z][y][x] == player:
-                my_count += 1
-            elif board[z][y][x] == opponent:
-                opponent_count += 1
-        
-        return my_count, opponent_count
-    
     def is_valid_move(self, board: Board, x: int, y: int) -> bool:
         if not (0 <= x <= 3 and 0 <= y <= 3):
             return False
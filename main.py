@@ -1,5 +1,11 @@
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+from array import array
+import base64
+import math
+import random
+import struct
 import time
+import zlib
 #from local_driver import Alg3D, Board # ローカル検証用
 from framework import Alg3D, Board # 本番用
 
@@ -57,43 +63,456 @@ class WinningPatterns:
         
         return lines
 
+    @staticmethod
+    def generate_line_masks() -> List[int]:
+        # 76ラインをそれぞれ64ビットマスクに変換
+        masks = []
+        for line in WinningPatterns.generate_all_winning_lines():
+            mask = 0
+            for x, y, z in line:
+                mask |= 1 << (x + 4 * y + 16 * z)
+            masks.append(mask)
+        return masks
+
+    @staticmethod
+    def generate_cell_lines() -> List[List[Tuple[int, int]]]:
+        # マス(ビット番号)ごとに、そのマスを通る (ライン番号, ライン内の位置) の一覧（3〜7本）
+        cell_lines = [[] for _ in range(64)]
+        for index, line in enumerate(WinningPatterns.generate_all_winning_lines()):
+            for offset, (x, y, z) in enumerate(line):
+                cell_lines[x + 4 * y + 16 * z].append((index, offset))
+        return cell_lines
+
+    @staticmethod
+    def generate_line_directions() -> List[Tuple[int, int]]:
+        # 同じ向き（ビット間隔）のラインをまとめた (間隔, 始点マスク) の一覧（13方向）
+        directions = {}
+        for mask in WinningPatterns.generate_line_masks():
+            low = (mask & -mask).bit_length() - 1
+            step = ((mask ^ 1 << low) & -(mask ^ 1 << low)).bit_length() - 1 - low
+            directions[step] = directions.get(step, 0) | 1 << low
+        return sorted(directions.items())
+
+    @staticmethod
+    def generate_symmetries() -> List[List[int]]:
+        # xy平面の8対称（回転・鏡映）を列番号(x + 4*y)の置換として生成。z方向は重力があるので変えない
+        transforms = [
+            lambda x, y: (x, y),
+            lambda x, y: (3 - y, x),
+            lambda x, y: (3 - x, 3 - y),
+            lambda x, y: (y, 3 - x),
+            lambda x, y: (3 - x, y),
+            lambda x, y: (x, 3 - y),
+            lambda x, y: (y, x),
+            lambda x, y: (3 - y, 3 - x),
+        ]
+        symmetries = []
+        for transform in transforms:
+            permutation = [0] * 16
+            for y in range(4):
+                for x in range(4):
+                    tx, ty = transform(x, y)
+                    permutation[x + 4 * y] = tx + 4 * ty
+            symmetries.append(permutation)
+        return symmetries
+
+def popcount(bits: int) -> int:
+    return bin(bits).count('1')
+
+LINE_MASKS = WinningPatterns.generate_line_masks()
+CELL_LINES = WinningPatterns.generate_cell_lines()
+LINE_DIRECTIONS = WinningPatterns.generate_line_directions()
+# SYMMETRIES[s][column] = 対称変換 s で移る列、INVERSE_SYMMETRIES はその逆変換
+SYMMETRIES = WinningPatterns.generate_symmetries()
+INVERSE_SYMMETRIES = [[permutation.index(column) for column in range(16)] for permutation in SYMMETRIES]
+
+# 位置価値（中心ほど高価値）
+POSITION_VALUES = [
+    [[1,2,2,1], [2,3,3,2], [2,3,3,2], [1,2,2,1]],
+    [[2,3,3,2], [3,4,4,3], [3,4,4,3], [2,3,3,2]],
+    [[2,3,3,2], [3,4,4,3], [3,4,4,3], [2,3,3,2]],
+    [[1,2,2,1], [2,3,3,2], [2,3,3,2], [1,2,2,1]]
+]
+# ビット番号順に並べた位置価値
+BIT_POSITION_VALUES = [POSITION_VALUES[z][y][x] for z in range(4) for y in range(4) for x in range(4)]
+
+def line_value(my_count: int, opponent_count: int) -> int:
+    # 1ラインの評価（自分の石数・相手の石数から）
+    if opponent_count > 0:
+        if opponent_count == 2 and my_count == 0:
+            return -50
+        elif opponent_count == 3 and my_count == 0:
+            return -500
+        return 0
+    
+    if my_count == 1:
+        return 1
+    elif my_count == 2:
+        return 10
+    elif my_count == 3:
+        return 100
+    return 0
+
+def build_line_pattern_table(value_function=line_value) -> List[int]:
+    # ラインの占有パターン（自分4ビット | 相手4ビット << 4）→ 評価値の256エントリ表
+    table = []
+    for pattern in range(256):
+        table.append(value_function(popcount(pattern & 0xF), popcount(pattern >> 4)))
+    return table
+
+def swap_pattern(pattern: int) -> int:
+    return (pattern >> 4) | (pattern & 0xF) << 4
+
+LINE_PATTERN_VALUES = build_line_pattern_table()
+# 盤面側のパターンは 黒4ビット | 白4ビット << 4 で持つので、白視点は入れ替えた表を使う
+PLAYER_PATTERN_VALUES = [None, LINE_PATTERN_VALUES,
+                         [LINE_PATTERN_VALUES[swap_pattern(pattern)] for pattern in range(256)]]
+
+# 4ビットの占有パターンに石がちょうど2つあるか
+OPEN_TWO = [popcount(pattern) == 2 for pattern in range(16)]
+
+def generate_zobrist_keys(seed: int = 20240901) -> Tuple[List[List[int]], int]:
+    # プレイヤー×マスごとの64ビット乱数（固定シードで毎回同じ値）
+    rng = random.Random(seed)
+    table = [[0] * 64] + [[rng.getrandbits(64) for _ in range(64)] for _ in range(2)]
+    side_key = rng.getrandbits(64)
+    return table, side_key
+
+ZOBRIST_TABLE, ZOBRIST_SIDE = generate_zobrist_keys()
+# SYMMETRIC_ZOBRIST[player][cell][s] = 対称変換 s 後のマスの乱数（手番の乱数も含めて push/pop で XOR）
+SYMMETRIC_ZOBRIST = [None] + [
+    [[ZOBRIST_TABLE[player][SYMMETRIES[s][cell & 15] + (cell & ~15)] ^ ZOBRIST_SIDE for s in range(8)]
+     for cell in range(64)]
+    for player in (1, 2)
+]
+
+class BitBoard:
+    # ビット番号 = x + 4*y + 16*z（z=0が最下層）
+    TOP_LAYER = 0xFFFF << 48
+
+    def __init__(self, black: int = 0, white: int = 0, player: int = 1):
+        # stones[player] でプレイヤーの石を参照（index 0 は未使用）
+        self.stones = [0, black, white]
+        # 手番のプレイヤー
+        self.player = player
+        # 列(x + 4*y)ごとの石の高さ
+        occupied = black | white
+        self.heights = [popcount(occupied & (0x0001000100010001 << column)) for column in range(16)]
+        # push で置いた列の履歴（pop で戻す）
+        self.history = []
+        # 8対称それぞれの Zobrist ハッシュ（push/pop で差分更新、keys[0] が実際の向き）
+        self.keys = self.compute_keys()
+        # ラインごとの占有パターン（黒4ビット | 白4ビット << 4）と、その合計評価を差分更新
+        self.line_patterns = [0] * len(LINE_MASKS)
+        for player in (1, 2):
+            stones = self.stones[player]
+            while stones:
+                low = stones & -stones
+                for line, offset in CELL_LINES[low.bit_length() - 1]:
+                    self.line_patterns[line] |= 1 << (offset + 4 * (player - 1))
+                stones ^= low
+        self.line_score = [0] + [sum(PLAYER_PATTERN_VALUES[player][pattern] for pattern in self.line_patterns)
+                                 for player in (1, 2)]
+        self.position_score = [0] + [sum(BIT_POSITION_VALUES[cell] for cell in range(64) if stones >> cell & 1)
+                                     for stones in (black, white)]
+
+    @staticmethod
+    def bit_index(x: int, y: int, z: int) -> int:
+        return x + 4 * y + 16 * z
+
+    @classmethod
+    def from_board(cls, board: Board, player: int = 1) -> 'BitBoard':
+        stones = [0, 0, 0]
+        for z in range(4):
+            for y in range(4):
+                for x in range(4):
+                    cell = board[z][y][x]
+                    if cell:
+                        stones[cell] |= 1 << cls.bit_index(x, y, z)
+        return cls(stones[1], stones[2], player)
+
+    def compute_keys(self) -> List[int]:
+        keys = []
+        for permutation in SYMMETRIES:
+            key = ZOBRIST_SIDE if self.player == 2 else 0
+            for player in (1, 2):
+                stones = self.stones[player]
+                while stones:
+                    low = stones & -stones
+                    cell = low.bit_length() - 1
+                    key ^= ZOBRIST_TABLE[player][permutation[cell & 15] + (cell & ~15)]
+                    stones ^= low
+            keys.append(key)
+        return keys
+
+    def canonical_key(self) -> Tuple[int, int]:
+        # 8対称の中で最小のハッシュと、そのときの対称変換番号
+        keys = self.keys
+        key = min(keys)
+        return key, keys.index(key)
+
+    def occupied(self) -> int:
+        return self.stones[1] | self.stones[2]
+
+    def last_cell(self) -> int:
+        column = self.history[-1]
+        return column + 16 * (self.heights[column] - 1)
+
+    def completes_line(self, cell: int, player: int) -> bool:
+        # cell に player の石があれば4つ揃うか（cell を通るラインだけ調べる）
+        shift = 4 * (player - 1)
+        patterns = self.line_patterns
+        for line, offset in CELL_LINES[cell]:
+            if (patterns[line] >> shift | 1 << offset) & 0xF == 0xF:
+                return True
+        return False
+
+    def creates_three(self, cell: int, player: int) -> bool:
+        # cell に置くと、相手の石がないラインで自分の石が3つになるか（新しい脅威を作る手）
+        shift = 4 * (player - 1)
+        patterns = self.line_patterns
+        for line, _ in CELL_LINES[cell]:
+            pattern = patterns[line]
+            if not pattern >> (4 - shift) & 0xF and OPEN_TWO[pattern >> shift & 0xF]:
+                return True
+        return False
+
+    def last_move_wins(self) -> bool:
+        # 直前に push した手で勝ったか
+        return bool(self.history) and self.completes_line(self.last_cell(), 3 - self.player)
+
+    def playable_cells(self) -> int:
+        # 重力で今すぐ置けるマス（最下層 + 石の真上の空きマス）
+        occupied = self.occupied()
+        return ((occupied << 16) | 0xFFFF) & ~occupied & 0xFFFFFFFFFFFFFFFF
+
+    def threat_cells(self, player: int) -> int:
+        # player があと1石で4つ揃う空きマス全体（置けるかどうかは問わない）
+        stones = self.stones[player]
+        threats = 0
+        for step, starts in LINE_DIRECTIONS:
+            a = stones & starts
+            b = stones >> step & starts
+            c = stones >> 2 * step & starts
+            d = stones >> 3 * step & starts
+            threats |= (b & c & d) | (a & c & d) << step | (a & b & d) << 2 * step | (a & b & c) << 3 * step
+        return threats & ~self.occupied()
+
+    def threat_map(self) -> Tuple[int, List[int], List[int]]:
+        # (置けるマス, 今すぐ勝てるマス[player], まだ置けない将来の勝ちマス[player]) を一度に計算
+        playable = self.playable_cells()
+        immediate = [0, 0, 0]
+        future = [0, 0, 0]
+        for player in (1, 2):
+            threats = self.threat_cells(player)
+            immediate[player] = threats & playable
+            future[player] = threats & ~playable
+        return playable, immediate, future
+
+    def push(self, x: int, y: int):
+        column = x + 4 * y
+        cell = column + 16 * self.heights[column]
+        self.stones[self.player] |= 1 << cell
+        self.update_keys(cell, self.player)
+        self.heights[column] += 1
+        self.history.append(column)
+        self.update_lines(cell, self.player, 1)
+        self.player = 3 - self.player
+
+    def pop(self):
+        column = self.history.pop()
+        self.player = 3 - self.player
+        self.heights[column] -= 1
+        cell = column + 16 * self.heights[column]
+        self.stones[self.player] ^= 1 << cell
+        self.update_keys(cell, self.player)
+        self.update_lines(cell, self.player, -1)
+
+    def unwind(self, length: int):
+        # 探索を途中で打ち切ったとき、履歴が length 手になるまで pop して元の局面に戻す
+        while len(self.history) > length:
+            self.pop()
+
+    def update_keys(self, cell: int, player: int):
+        keys = self.keys
+        xors = SYMMETRIC_ZOBRIST[player][cell]
+        for s in range(8):
+            keys[s] ^= xors[s]
+
+    def update_lines(self, cell: int, player: int, delta: int):
+        # 変化したマスを通るラインだけパターンと評価を表引きで更新
+        patterns = self.line_patterns
+        black_values = PLAYER_PATTERN_VALUES[1]
+        white_values = PLAYER_PATTERN_VALUES[2]
+        shift = 4 * (player - 1)
+        black_gain = 0
+        white_gain = 0
+        for line, offset in CELL_LINES[cell]:
+            old_pattern = patterns[line]
+            new_pattern = old_pattern ^ (1 << (offset + shift))
+            black_gain += black_values[new_pattern] - black_values[old_pattern]
+            white_gain += white_values[new_pattern] - white_values[old_pattern]
+            patterns[line] = new_pattern
+        self.line_score[1] += black_gain
+        self.line_score[2] += white_gain
+        self.position_score[player] += delta * BIT_POSITION_VALUES[cell]
+
 class TranspositionTable:
-    def __init__(self, size=100000):
-        self.table = {}
-        self.max_size = size
-    
-    def get_board_hash(self, board: Board) -> str:
-        return str(board)
-    
-    def store(self, board: Board, depth: int, score: int, flag: str, best_move: Optional[Tuple[int, int]]):
-        board_hash = self.get_board_hash(board)
-        if len(self.table) < self.max_size:
-            self.table[board_hash] = (depth, score, flag, best_move)
-    
-    def lookup(self, board: Board, depth: int) -> Optional[Tuple[int, str, Optional[Tuple[int, int]]]]:
-        board_hash = self.get_board_hash(board)
-        if board_hash in self.table:
-            stored_depth, score, flag, best_move = self.table[board_hash]
-            if stored_depth >= depth:
-                return score, flag, best_move
+    # 評価値は手番側から見た値なので先手・後手で共有でき、MyAI が作り直されても前回の探索結果を再利用する
+    _shared = None
+    
+    # エントリ = キー64ビット + データ64ビット（16バイト）
+    ENTRY_BYTES = 16
+    FLAG_CODES = {'EXACT': 1, 'LOWERBOUND': 2, 'UPPERBOUND': 3}
+    FLAG_NAMES = [None, 'EXACT', 'LOWERBOUND', 'UPPERBOUND']
+    
+    # データ語のビット配置: 深さ6 | フラグ2 | 評価値32 | 手5 | 世代8
+    DEPTH_SHIFT = 0
+    FLAG_SHIFT = 6
+    SCORE_SHIFT = 8
+    MOVE_SHIFT = 40
+    GENERATION_SHIFT = 45
+    DEPTH_MASK = 0x3F
+    FLAG_MASK = 0x3
+    SCORE_MASK = 0xFFFFFFFF
+    MOVE_MASK = 0x1F
+    SCORE_OFFSET = 1 << 31
+    # 置換の優先度 = 深さ - 世代の古さ × この値（1手前の探索の結果は2手分浅く読んだものとして扱う）
+    AGE_PENALTY = 2
+    
+    def __init__(self, size_mb=64):
+        # 1バケット = 深さ優先スロット + 常時置換スロット
+        bucket_count = 1
+        while bucket_count * 4 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            bucket_count *= 2
+        self.bucket_mask = bucket_count - 1
+        self.keys = array('Q', bytes(8 * 2 * bucket_count))
+        self.data = array('Q', bytes(8 * 2 * bucket_count))
+        # get_move ごとに進める世代カウンタ（8ビットで循環）
+        self.generation = 0
+    
+    @classmethod
+    def shared(cls) -> 'TranspositionTable':
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+    
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+    
+    def get_board_hash(self, board: BitBoard) -> Tuple[int, int]:
+        # 対称な局面は同じエントリを共有する（手は正規化した向きで保存）
+        return board.canonical_key()
+    
+    def pack(self, depth: int, score: int, flag: str, best_move: Optional[Tuple[int, int]], symmetry: int) -> int:
+        move_code = SYMMETRIES[symmetry][best_move[0] + 4 * best_move[1]] + 1 if best_move else 0
+        score = max(-self.SCORE_OFFSET, min(self.SCORE_OFFSET - 1, int(score)))
+        return (min(depth, self.DEPTH_MASK) << self.DEPTH_SHIFT
+                | self.FLAG_CODES[flag] << self.FLAG_SHIFT
+                | (score + self.SCORE_OFFSET) << self.SCORE_SHIFT
+                | move_code << self.MOVE_SHIFT
+                | self.generation << self.GENERATION_SHIFT)
+    
+    def store(self, board: BitBoard, depth: int, score: int, flag: str, best_move: Optional[Tuple[int, int]]):
+        board_hash, symmetry = self.get_board_hash(board)
+        slot = (board_hash & self.bucket_mask) << 1
+        entry = self.pack(depth, score, flag, best_move, symmetry)
+        
+        # 同一局面か、古さを差し引いた深さ以上なら深さ優先スロットを置換し、
+        # 追い出した別局面のエントリは捨てずに常時置換スロットへ移す
+        current = self.data[slot]
+        if not current or self.keys[slot] == board_hash:
+            self.keys[slot] = board_hash
+            self.data[slot] = entry
+        elif depth >= self.priority(current):
+            self.keys[slot + 1] = self.keys[slot]
+            self.data[slot + 1] = current
+            self.keys[slot] = board_hash
+            self.data[slot] = entry
+        else:
+            self.keys[slot + 1] = board_hash
+            self.data[slot + 1] = entry
+    
+    def priority(self, entry: int) -> int:
+        age = (self.generation - (entry >> self.GENERATION_SHIFT)) & 0xFF
+        return (entry >> self.DEPTH_SHIFT & self.DEPTH_MASK) - self.AGE_PENALTY * age
+    
+    def lookup(self, board: BitBoard) -> Optional[Tuple[int, int, str, Optional[Tuple[int, int]]]]:
+        # (保存時の深さ, 評価値, フラグ, 最善手)。深さが足りなくても最善手は手の並べ替えに使える
+        board_hash, symmetry = self.get_board_hash(board)
+        slot = (board_hash & self.bucket_mask) << 1
+        for index in (slot, slot + 1):
+            entry = self.data[index]
+            if entry and self.keys[index] == board_hash:
+                flag = self.FLAG_NAMES[entry >> self.FLAG_SHIFT & self.FLAG_MASK]
+                score = (entry >> self.SCORE_SHIFT & self.SCORE_MASK) - self.SCORE_OFFSET
+                move_code = entry >> self.MOVE_SHIFT & self.MOVE_MASK
+                best_move = None
+                if move_code:
+                    column = INVERSE_SYMMETRIES[symmetry][move_code - 1]
+                    best_move = (column & 3, column >> 2)
+                return entry >> self.DEPTH_SHIFT & self.DEPTH_MASK, score, flag, best_move
         return None
 
+# 定跡データ: (正規化Zobristハッシュ, 正規化した向きでの列番号) を '<QB' で並べ zlib + base64 で圧縮
+OPENING_BOOK_DATA = (
+    'eNoBaAGX/gAAAAAAAAAAAK3vDPNQHugAD0eYKgJXA1cBA7aCv3ywcJwBCnj3Vnle7kMFA85qaDcm'
+    'P6gFACCdvzhR3msHCSoJiSuzDJcHAVSo2snDOQQJDAzCM4jMCSwLDD5xRwH9OC4MCtMtc2qTIeUM'
+    'A6OuJsKf4GUPDD+zlyFYDIIPAEGG4oedjqkQBRpJ7/D2qDASA9qdm2kzh2oSA6OGR/uVx8gTAEiV'
+    'n3QyP6YWA0g3pJHyQk4XBozarP1aTl4YD1wpb1ImEY0cBox5dTef0Y4gD5NsWiMbR34iANjis6nh'
+    'tvgiAEgD1Omm6hAkD4aWO3RJlBopBZjFhRGL/6UqCgdXxgj5QzMsDpJ98Qo3UlEsD9PfeDnrOjsw'
+    'D6Gi5wKri1AyCYEhp2sG2O8yBuRTqycQ2AM0D4H8ZzEziXo5D373zwK8EAg/CqP3JiZNgUpNCaVc'
+    'Dt+gjuVVA6p86xrsg2tZBu0uFo7+h9Z2DG7BiqY='
+)
+
+class OpeningBook:
+    ENTRY_FORMAT = '<QB'
+    
+    def __init__(self, data: str = OPENING_BOOK_DATA, max_stones: int = 2):
+        self.data = data
+        # この石数以下の局面だけ定跡を引く
+        self.max_stones = max_stones
+        # 初めて使うときに展開する
+        self.entries = None
+    
+    @classmethod
+    def encode(cls, entries: Dict[int, int]) -> str:
+        packed = b''.join(struct.pack(cls.ENTRY_FORMAT, key, column) for key, column in sorted(entries.items()))
+        return base64.b64encode(zlib.compress(packed, 9)).decode('ascii')
+    
+    @classmethod
+    def decode(cls, data: str) -> Dict[int, int]:
+        if not data:
+            return {}
+        packed = zlib.decompress(base64.b64decode(data))
+        return {key: column for key, column in struct.iter_unpack(cls.ENTRY_FORMAT, packed)}
+    
+    def get_move(self, board: BitBoard) -> Optional[Tuple[int, int]]:
+        if popcount(board.occupied()) > self.max_stones:
+            return None
+        if self.entries is None:
+            self.entries = self.decode(self.data)
+        
+        key, symmetry = board.canonical_key()
+        column = self.entries.get(key)
+        if column is None:
+            return None
+        # 正規化した向きの手を実際の向きに戻す
+        column = INVERSE_SYMMETRIES[symmetry][column]
+        if board.heights[column] >= 4:
+            return None
+        return (column & 3, column >> 2)
+
 class GameEngine:
     def __init__(self):
-        self.winning_lines = WinningPatterns.generate_all_winning_lines()
-        self.POSITION_VALUES = [
-            [[1,2,2,1], [2,3,3,2], [2,3,3,2], [1,2,2,1]],
-            [[2,3,3,2], [3,4,4,3], [3,4,4,3], [2,3,3,2]],
-            [[2,3,3,2], [3,4,4,3], [3,4,4,3], [2,3,3,2]],
-            [[1,2,2,1], [2,3,3,2], [2,3,3,2], [1,2,2,1]]
-        ]
+        self.line_masks = LINE_MASKS
     
-    def is_valid_move(self, board: Board, x: int, y: int) -> bool:
+    def is_valid_move(self, board: BitBoard, x: int, y: int) -> bool:
         if not (0 <= x <= 3 and 0 <= y <= 3):
             return False
-        return board[3][y][x] == 0
+        return board.heights[x + 4 * y] < 4
     
-    def get_valid_moves(self, board: Board) -> List[Tuple[int, int]]:
+    def get_valid_moves(self, board: BitBoard) -> List[Tuple[int, int]]:
         moves = []
         priority_positions = [
             (1,1), (2,1), (1,2), (2,2),
@@ -107,94 +526,467 @@ class GameEngine:
         
         return moves
     
-    def make_move(self, board: Board, x: int, y: int, player: int) -> Board:
-        new_board = [[[board[z][y][x] for x in range(4)] for y in range(4)] for z in range(4)]
-        
-        for z in range(4):
-            if new_board[z][y][x] == 0:
-                new_board[z][y][x] = player
-                break
-        
-        return new_board
+    def get_forcing_moves(self, board: BitBoard,
+                          threats: Optional[Tuple[int, List[int], List[int]]] = None) -> List[Tuple[int, int]]:
+        # 勝ちマスがあればその手だけ、相手の勝ちマスがあれば受けの手だけを返す
+        # threats に board.threat_map() の結果を渡せば脅威の計算を省く
+        _, immediate, _ = threats or board.threat_map()
+        for player in (board.player, 3 - board.player):
+            cells = immediate[player]
+            if cells:
+                moves = []
+                while cells:
+                    low = cells & -cells
+                    column = (low.bit_length() - 1) & 15
+                    moves.append((column & 3, column >> 2))
+                    cells ^= low
+                return moves
+        return self.get_valid_moves(board)
+    
+    def is_winning_position(self, board: BitBoard, player: int) -> bool:
+        return self.is_winning_stones(board.stones[player])
     
-    def is_winning_position(self, board: Board, player: int) -> bool:
-        for line in self.winning_lines:
-            if self.check_line(board, line, player):
+    def is_winning_stones(self, stones: int) -> bool:
+        for mask in self.line_masks:
+            if stones & mask == mask:
                 return True
         return False
     
-    def check_line(self, board: Board, line: List[Tuple[int, int, int]], player: int) -> bool:
-        for x, y, z in line:
-            if board[z][y][x] != player:
-                return False
-        return True
+    def is_board_full(self, board: BitBoard) -> bool:
+        return board.occupied() & BitBoard.TOP_LAYER == BitBoard.TOP_LAYER
     
-    def is_board_full(self, board: Board) -> bool:
-        for y in range(4):
-            for x in range(4):
-                if board[3][y][x] == 0:
-                    return False
-        return True
-    
-    def evaluate_position(self, board: Board, player: int) -> int:
+    def evaluate_position(self, board: BitBoard, player: int) -> int:
         score = 0
         opponent = 3 - player
         
-        if self.is_winning_position(board, player):
-            return 10000
-        if self.is_winning_position(board, opponent):
-            return -10000
+        # 探索中は直前の手を通るラインだけで勝敗判定（ルートのみ全ライン）
+        if board.history:
+            if board.last_move_wins():
+                return 10000 if board.player == opponent else -10000
+        else:
+            if self.is_winning_position(board, player):
+                return 10000
+            if self.is_winning_position(board, opponent):
+                return -10000
         if self.is_board_full(board):
             return 0
         
-        # 勝利ライン評価
-        for line in self.winning_lines:
-            my_count, opponent_count = self.count_line_stones(board, line, player)
-            
-            if opponent_count > 0:
-                if opponent_count == 2 and my_count == 0:
-                    score -= 50
-                elif opponent_count == 3 and my_count == 0:
-                    score -= 500
-                continue
+        # 勝利ライン評価・中心制御評価（push/pop で差分更新済みの値を読むだけ）
+        # 両者の値の差をとり、手番を入れ替えると符号だけが反転するようにする（negamax の前提）
+        score += board.line_score[player] - board.line_score[opponent]
+        score += board.position_score[player] - board.position_score[opponent]
+        
+        return score
+
+class TimeManager:
+    # サーバの制限（1手あたり CPU 時間 約3秒・待ち時間 10秒）に対して、安全マージンを残した持ち時間を管理する
+    CPU_LIMIT = 3.0
+    WALL_LIMIT = 10.0
+    # 盤上の石数ごとの段階と、各段階で読み切り・連続脅威探索・証明数探索に割く持ち時間の割合
+    # （残りはすべて通常探索に使う。1手ごとの制限で時間は持ち越せないので、序盤ほど通常探索に回す）
+    PHASES = (
+        (10, {'endgame': 0.0, 'threat': 0.05, 'proof': 0.10}),
+        (30, {'endgame': 0.3, 'threat': 0.10, 'proof': 0.15}),
+        (64, {'endgame': 0.6, 'threat': 0.05, 'proof': 0.10}),
+    )
+    
+    def __init__(self, cpu_limit: float = CPU_LIMIT, wall_limit: float = WALL_LIMIT, safety_margin: float = 0.5):
+        # 制限からこの秒数を引いた値を持ち時間とする
+        self.cpu_budget = cpu_limit - safety_margin
+        self.wall_budget = wall_limit - safety_margin
+        self.cpu_start = 0.0
+        self.wall_start = 0.0
+        self.shares = self.PHASES[0][1]
+    
+    def start(self, board: BitBoard):
+        # get_move の最初に呼び、この手の計測を始める
+        self.cpu_start = time.process_time()
+        self.wall_start = time.time()
+        stones = popcount(board.occupied())
+        for limit, shares in self.PHASES:
+            if stones < limit:
+                self.shares = shares
+                break
+    
+    def used(self) -> float:
+        # 持ち時間のうち使った割合（CPU 時間と待ち時間の厳しい方）
+        cpu = (time.process_time() - self.cpu_start) / self.cpu_budget
+        wall = (time.time() - self.wall_start) / self.wall_budget
+        return max(cpu, wall)
+    
+    def is_time_up(self, limit: float = 1.0) -> bool:
+        return self.used() >= limit
+    
+    def stage_deadline(self, stage: str):
+        # 今から段階ごとの割合だけ使ったら時間切れになる判定関数
+        limit = min(self.used() + self.shares[stage], 1.0)
+        return lambda: self.is_time_up(limit)
+
+class SearchTimeout(Exception):
+    # 時間切れで探索を打ち切るときに投げる
+    pass
+
+class EndgameSolver:
+    # 残りマスが少ない局面を勝ち・負け・引き分けまで読み切る
+    WIN_SCORE = 1000
+    
+    def __init__(self, empty_threshold: int = 14, cache_size: int = 1000000):
+        self.game_engine = GameEngine()
+        # 空きマスがこの数以下なら読み切りを試みる
+        self.empty_threshold = empty_threshold
+        # 正規化キー → (下限, 上限)（局面からの手数で表した値）
+        self.cache = {}
+        self.cache_size = cache_size
+        self.nodes = 0
+        self.is_time_up = None
+        self.root_move = None
+    
+    def is_applicable(self, board: BitBoard) -> bool:
+        return 64 - popcount(board.occupied()) <= self.empty_threshold
+    
+    def solve(self, board: BitBoard, is_time_up) -> Optional[Tuple[Tuple[int, int], int]]:
+        # (最善手, 評価値) を返す。評価値 > 0 は勝ち（WIN_SCORE - 勝ちまでの手数）、< 0 は負け、0 は引き分け
+        # 勝ちなら最短、負けなら最長の手順を選ぶ。時間切れなら None
+        self.nodes = 0
+        self.is_time_up = is_time_up
+        if len(self.cache) > self.cache_size:
+            self.cache.clear()
+        
+        root_length = len(board.history)
+        try:
+            # まず最小幅の窓で勝ち負けだけを判定し、その範囲の中で正確な手数を求める
+            value = self.negamax(board, 0, -1, 1)
+            if value >= 1:
+                value = self.negamax(board, 0, 0, self.WIN_SCORE)
+            elif value <= -1:
+                value = self.negamax(board, 0, -self.WIN_SCORE, 0)
+        except SearchTimeout:
+            board.unwind(root_length)
+            return None
+        return self.root_move, value
+    
+    def negamax(self, board: BitBoard, ply: int, alpha: int, beta: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and self.is_time_up():
+            raise SearchTimeout()
+        
+        # 直前の相手の手で負けている
+        if board.last_move_wins():
+            return ply - self.WIN_SCORE
+        if self.game_engine.is_board_full(board):
+            return 0
+        
+        # 手数による枝刈り（これより早く勝つ・遅く負けることはない）
+        alpha = max(alpha, ply - self.WIN_SCORE)
+        beta = min(beta, self.WIN_SCORE - ply - 1)
+        if alpha >= beta:
+            return alpha
+        
+        key = None
+        if ply > 0:
+            key, _ = board.canonical_key()
+            bounds = self.cache.get(key)
+            if bounds is not None:
+                lower = self.from_cache_score(bounds[0], ply)
+                upper = self.from_cache_score(bounds[1], ply)
+                if lower >= beta or lower == upper:
+                    return lower
+                if upper <= alpha:
+                    return upper
+                alpha = max(alpha, lower)
+                beta = min(beta, upper)
+        
+        original_alpha = alpha
+        best_score = -self.WIN_SCORE
+        for x, y in self.game_engine.get_forcing_moves(board):
+            board.push(x, y)
+            score = -self.negamax(board, ply + 1, -beta, -alpha)
+            board.pop()
             
-            if my_count == 1:
-                score += 1
-            elif my_count == 2:
-                score += 10
-            elif my_count == 3:
-                score += 100
-        
-        # 中心制御評価
-        for z in range(4):
-            for y in range(4):
-                for x in range(4):
-                    if board[z][y][x] == player:
-                        score += self.POSITION_VALUES[z][y][x]
-                    elif board[z][y][x] == opponent:
-                        score -= self.POSITION_VALUES[z][y][x]
+            if score > best_score:
+                best_score = score
+                if ply == 0:
+                    self.root_move = (x, y)
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
         
+        if key is not None:
+            lower, upper = -self.WIN_SCORE, self.WIN_SCORE
+            if best_score > original_alpha:
+                lower = best_score
+            if best_score < beta:
+                upper = best_score
+            self.cache[key] = (self.to_cache_score(lower, ply), self.to_cache_score(upper, ply))
+        return best_score
+    
+    def to_cache_score(self, score: int, ply: int) -> int:
+        # 勝ち負けの手数をルートからではなくその局面からの手数に直して保存
+        if score > 0:
+            return score + ply
+        if score < 0:
+            return score - ply
         return score
     
-    def count_line_stones(self, board: Board, line: List[Tuple[int, int, int]], player: int) -> Tuple[int, int]:
-        my_count = 0
-        opponent_count = 0
-        opponent = 3 - player
+    def from_cache_score(self, score: int, ply: int) -> int:
+        if score > 0:
+            return score - ply
+        if score < 0:
+            return score + ply
+        return score
+
+class ThreatSpaceSearch:
+    # 3つ揃い（今置ける勝ちマス）を作る手だけを読み、相手の応手は受けの1手に限定する脅威空間探索
+    def __init__(self, max_depth: int = 10, max_nodes: int = 20000):
+        self.game_engine = GameEngine()
+        # 攻め側の手数の上限
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.is_time_up = None
+        # 正規化キー → 勝てなかった残り深さ
+        self.failed = {}
+    
+    def find_winning_move(self, board: BitBoard, is_time_up) -> Optional[Tuple[int, int]]:
+        # 手番側の連続脅威による必勝手を返す（短い手順から順に探す）
+        self.nodes = 0
+        self.is_time_up = is_time_up
+        self.failed = {}
+        root_length = len(board.history)
+        try:
+            for depth in range(1, self.max_depth + 1):
+                move = self.attack(board, depth)
+                if move:
+                    return move
+        except SearchTimeout:
+            board.unwind(root_length)
+        return None
+    
+    def attack(self, board: BitBoard, depth: int) -> Optional[Tuple[int, int]]:
+        self.nodes += 1
+        if self.nodes >= self.max_nodes or (self.nodes & 255 == 0 and self.is_time_up()):
+            raise SearchTimeout()
+        
+        attacker = board.player
+        playable = board.playable_cells()
+        wins = board.threat_cells(attacker) & playable
+        if wins:
+            return self.cell_to_move(wins)
+        if depth == 0:
+            return None
         
-        for x, y, z in line:
-            if board[z][y][x] == player:
-                my_count += 1
-            elif board[z][y][x] == opponent:
-                opponent_count += 1
+        key, _ = board.canonical_key()
+        if self.failed.get(key, -1) >= depth:
+            return None
         
-        return my_count, opponent_count
+        defender_wins = board.threat_cells(3 - attacker) & playable
+        if defender_wins:
+            # 相手の勝ちマスが2つ以上なら受けきれない。1つなら受けるしかない
+            if defender_wins & (defender_wins - 1):
+                self.failed[key] = depth
+                return None
+            candidates = [self.cell_to_move(defender_wins)]
+        else:
+            candidates = self.game_engine.get_valid_moves(board)
+        
+        for x, y in candidates:
+            board.push(x, y)
+            # 今置ける勝ちマスを作った手だけを読む（重力で置けない3つ揃いは相手に受けを強制しない）
+            if defender_wins or board.threat_cells(attacker) & board.playable_cells():
+                if self.defend(board, depth - 1):
+                    board.pop()
+                    return (x, y)
+            board.pop()
+        
+        self.failed[key] = depth
+        return None
+    
+    def defend(self, board: BitBoard, depth: int) -> bool:
+        # 受け側の手番。攻め側が必ず勝てるなら True
+        defender = board.player
+        playable = board.playable_cells()
+        if board.threat_cells(defender) & playable:
+            return False
+        threats = board.threat_cells(3 - defender) & playable
+        if not threats:
+            return False
+        if threats & (threats - 1):
+            # 勝ちマスが2つ以上（ダブルリーチ）
+            return True
+        
+        x, y = self.cell_to_move(threats)
+        board.push(x, y)
+        result = self.attack(board, depth) is not None
+        board.pop()
+        return result
+    
+    def cell_to_move(self, cells: int) -> Tuple[int, int]:
+        column = ((cells & -cells).bit_length() - 1) & 15
+        return (column & 3, column >> 2)
+
+class ProofNumberSearch:
+    # 証明数探索で「attacker が必ず勝てるか」を節点数の上限つきで証明・反証する
+    INFINITY = 10 ** 9
+    
+    def __init__(self, max_nodes: int = 10000):
+        self.game_engine = GameEngine()
+        self.max_nodes = max_nodes
+        self.reset()
+    
+    def reset(self):
+        # 節点表（節点番号で引く並列リスト）
+        self.proof = []
+        self.disproof = []
+        self.parent = []
+        self.column = []
+        self.first_child = []
+        self.child_count = []
+        self.attacker_to_move = []
+    
+    def new_node(self, board: BitBoard, parent: int, column: int, attacker: int) -> int:
+        node = len(self.proof)
+        self.parent.append(parent)
+        self.column.append(column)
+        self.first_child.append(-1)
+        self.child_count.append(0)
+        self.attacker_to_move.append(board.player == attacker)
+        
+        proof, disproof = 1, 1
+        if board.last_move_wins():
+            # 直前の手で勝負がついている
+            proof, disproof = (0, self.INFINITY) if board.player != attacker else (self.INFINITY, 0)
+        elif self.game_engine.is_board_full(board):
+            proof, disproof = self.INFINITY, 0
+        elif board.threat_cells(board.player) & board.playable_cells():
+            # 手番側が次の1手で勝てる（重力で今置けるマスだけを見る）
+            proof, disproof = (0, self.INFINITY) if board.player == attacker else (self.INFINITY, 0)
+        self.proof.append(proof)
+        self.disproof.append(disproof)
+        return node
+    
+    def prove(self, board: BitBoard, attacker: int, is_time_up) -> int:
+        # ルート節点を返す。proof[root] == 0 なら証明、disproof[root] == 0 なら反証、どちらでもなければ未解決
+        self.reset()
+        root = self.new_node(board, -1, -1, attacker)
+        if not board.last_move_wins() and not self.game_engine.is_board_full(board):
+            # ルートは必ず展開して、どの手で勝つ（負ける）かを子節点に残す
+            self.proof[root], self.disproof[root] = 1, 1
+        iterations = 0
+        while self.proof[root] and self.disproof[root] and len(self.proof) < self.max_nodes:
+            iterations += 1
+            if iterations & 63 == 0 and is_time_up():
+                break
+            
+            # 最有力節点まで降りる
+            node = root
+            while self.child_count[node]:
+                node = self.select_child(node)
+                column = self.column[node]
+                board.push(column & 3, column >> 2)
+            
+            self.expand(board, node, attacker)
+            
+            # ルートまで証明数・反証数を更新しながら戻る
+            while node != root:
+                self.update(node)
+                node = self.parent[node]
+                board.pop()
+            self.update(root)
+        return root
+    
+    def select_child(self, node: int) -> int:
+        start = self.first_child[node]
+        children = range(start, start + self.child_count[node])
+        if self.attacker_to_move[node]:
+            return min(children, key=self.proof.__getitem__)
+        return min(children, key=self.disproof.__getitem__)
+    
+    def expand(self, board: BitBoard, node: int, attacker: int):
+        self.first_child[node] = len(self.proof)
+        moves = self.game_engine.get_forcing_moves(board)
+        for x, y in moves:
+            board.push(x, y)
+            self.new_node(board, node, x + 4 * y, attacker)
+            board.pop()
+        self.child_count[node] = len(moves)
+    
+    def update(self, node: int):
+        count = self.child_count[node]
+        if not count:
+            return
+        start = self.first_child[node]
+        proofs = self.proof[start:start + count]
+        disproofs = self.disproof[start:start + count]
+        if self.attacker_to_move[node]:
+            self.proof[node] = min(proofs)
+            self.disproof[node] = min(sum(disproofs), self.INFINITY)
+        else:
+            self.proof[node] = min(sum(proofs), self.INFINITY)
+            self.disproof[node] = min(disproofs)
+    
+    def children(self, node: int) -> List[Tuple[Tuple[int, int], int, int]]:
+        # ((x, y), 証明数, 反証数) の一覧
+        start = self.first_child[node]
+        result = []
+        for child in range(start, start + self.child_count[node]):
+            column = self.column[child]
+            result.append(((column & 3, column >> 2), self.proof[child], self.disproof[child]))
+        return result
+    
+    def find_forced_win(self, board: BitBoard, is_time_up) -> Optional[Tuple[int, int]]:
+        # 手番側の必勝手が証明できればその手を返す
+        root = self.prove(board, board.player, is_time_up)
+        if self.proof[root] == 0:
+            for move, proof, _ in self.children(root):
+                if proof == 0:
+                    return move
+        return None
+    
+    def find_losing_moves(self, board: BitBoard, is_time_up) -> List[Tuple[int, int]]:
+        # 相手の必勝が証明された（指すと負けが確定する）手番側の手の一覧
+        root = self.prove(board, 3 - board.player, is_time_up)
+        return [move for move, proof, _ in self.children(root) if proof == 0]
 
-class MyAI(Alg3D):
+class MinimaxAI(Alg3D):
+    INFINITY = 1000000
+    # 勝ちの評価値は MATE_SCORE - ルートからの手数（負けはその符号反転）で、早い勝ち・遅い負けほど良い
+    MATE_SCORE = 10000
+    # これ以上の評価値は勝ち（負け）が見えている
+    WIN_THRESHOLD = 9000
+    ASPIRATION_WINDOW = 100
+    LMR_MIN_DEPTH = 3
+    LMR_MIN_MOVES = 4
+    # 時計を見る間隔（節点数、2のべき乗）
+    TIME_CHECK_INTERVAL = 256
+    # 予測した応手への返し手として覚えておく置換表の深さの下限と、次の手番で確かめる探索の深さ
+    PREPARED_MIN_DEPTH = 5
+    VERIFY_DEPTH = 3
+    
     def __init__(self):
         self.game_engine = GameEngine()
-        self.transposition_table = TranspositionTable()
-        self.start_time = 0
-        self.time_limit = 8.5
+        self.opening_book = OpeningBook()
+        self.endgame_solver = EndgameSolver()
+        self.threat_search = ThreatSpaceSearch()
+        self.proof_search = ProofNumberSearch()
+        self.transposition_table = None
+        # 予測した返し手の確認探索中は、置換表を手の並べ替えだけに使い、打ち切りも書き込みもしない
+        self.verifying = False
+        # ルートで探索から外す手（必敗が証明された手）
+        self.excluded_root_moves = []
+        # 静止探索（末端での勝ち・受けの手だけの延長）の上限
+        self.quiescence_max_depth = 8
+        self.quiescence_node_limit = 50000
+        self.quiescence_nodes = 0
+        # 手の並べ替え用: 手数(ルートからの深さ)ごとのキラー手と、手番・列ごとの履歴値
+        self.killer_moves = [[] for _ in range(64)]
+        self.history_scores = [[0] * 16 for _ in range(3)]
+        self.nodes = 0
+        self.iteration_stats = []
+        self.root_ply = 0
+        # (相手の応手 (x, y, z), 応手後の局面のハッシュ) → (返し手, 評価値, フラグ)
+        self.prepared_replies = {}
+        self.time_manager = TimeManager()
     
     def get_move(
         self,
@@ -202,117 +994,550 @@ class MyAI(Alg3D):
         player: int,
         last_move: Tuple[int, int, int]
     ) -> Tuple[int, int]:
-        self.start_time = time.time()
+        # 入力盤面はここで一度だけビットボードへ変換
+        board = BitBoard.from_board(board, player)
+        self.time_manager.start(board)
+        # 前回の探索で相手のこの応手を予測していれば、用意した返し手を取り出す
+        prepared = self.prepared_replies.get((tuple(last_move), board.keys[0])) if last_move else None
+        self.prepared_replies = {}
         
-        # 即座勝利チェック
-        winning_move = self.find_immediate_win(board, player)
-        if winning_move:
-            return winning_move
+        # 定跡チェック
+        opening_move = self.opening_book.get_move(board)
+        if opening_move:
+            return opening_move
         
-        # 脅威ブロック
+        # 即座勝利チェック・脅威ブロック（両者の勝ちマスを一度に計算）
         opponent = 3 - player
-        blocking_move = self.find_immediate_win(board, opponent)
-        if blocking_move:
-            return blocking_move
+        _, immediate, _ = board.threat_map()
+        if immediate[player]:
+            return self.cell_to_move(immediate[player])
+        if immediate[opponent]:
+            return self.cell_to_move(immediate[opponent])
         
-        # Iterative Deepening Minimax
-        best_move = None
-        for depth in range(1, 8):
-            if self.is_time_up():
+        # 終盤は読み切り（割り当て時間内に読み切れなければ通常探索へ）
+        if self.endgame_solver.is_applicable(board):
+            result = self.endgame_solver.solve(board, self.time_manager.stage_deadline('endgame'))
+            if result:
+                return result[0]
+        
+        # 置換表・キラー手・履歴値はこの手番の確認探索と通常探索で共有する
+        self.begin_search()
+        
+        # 予測どおりの応手なら、用意した返し手を（勝ちが見えていなければ浅い探索で確かめて）すぐ返す
+        if prepared:
+            # （確認探索は置換表に書き込まないので、この手の後の応手は用意できない）
+            move = self.verify_prepared_move(board, player, prepared)
+            if move:
+                return move
+        
+        # 連続脅威（3つ揃いの連続）で勝てる手順を探す
+        threat_win = self.threat_search.find_winning_move(board, self.time_manager.stage_deadline('threat'))
+        if threat_win:
+            return threat_win
+        
+        # 証明数探索で必勝手順を探し、必敗が証明された手は探索から外す
+        proof_deadline = self.time_manager.stage_deadline('proof')
+        forced_win = self.proof_search.find_forced_win(board, proof_deadline)
+        if forced_win:
+            return forced_win
+        losing_moves = self.proof_search.find_losing_moves(board, proof_deadline)
+        if len(losing_moves) < len(self.game_engine.get_valid_moves(board)):
+            self.excluded_root_moves = losing_moves
+        else:
+            self.excluded_root_moves = []
+        
+        move = self.search(board, player, 7)
+        self.prepare_replies(board, move)
+        return move
+    
+    def prepare_replies(self, board: BitBoard, move: Tuple[int, int]):
+        # 自分の手の後の相手の各応手について、置換表に十分深く読んだ最善手があれば次の手番用に覚えておく
+        board.push(*move)
+        if not board.last_move_wins():
+            for x, y in self.game_engine.get_valid_moves(board):
+                board.push(x, y)
+                if not board.last_move_wins():
+                    tt_result = self.transposition_table.lookup(board)
+                    if tt_result and tt_result[3] and tt_result[0] >= self.PREPARED_MIN_DEPTH:
+                        column = x + 4 * y
+                        reply = (x, y, board.heights[column] - 1)
+                        self.prepared_replies[(reply, board.keys[0])] = (tt_result[3], tt_result[1], tt_result[2])
+                board.pop()
+        board.pop()
+    
+    def verify_prepared_move(self, board: BitBoard, player: int,
+                             prepared: Tuple[Tuple[int, int], int, str]) -> Optional[Tuple[int, int]]:
+        # 勝ちが証明済みならそのまま、そうでなければ浅い探索の最善手と一致したときだけ採用する
+        move, score, flag = prepared
+        if move not in self.game_engine.get_valid_moves(board):
+            return None
+        if score >= self.WIN_THRESHOLD and flag != 'UPPERBOUND':
+            return move
+        # 返し手を用意した深い探索の結果をそのまま読み返さないよう置換表では打ち切らず、
+        # 確認に外れたときの通常探索のために前回の深いエントリを浅い結果で上書きしない
+        self.excluded_root_moves = []
+        self.verifying = True
+        try:
+            return move if self.search(board, player, self.VERIFY_DEPTH) == move else None
+        finally:
+            self.verifying = False
+    
+    def begin_search(self):
+        # 1手につき1回、search の前に呼ぶ
+        # 置換表は前回の get_move から引き継ぎ、世代だけ進める
+        self.transposition_table = TranspositionTable.shared()
+        self.transposition_table.new_search()
+        # キラー手・履歴値は同じ手番の探索どうしで引き継ぐ（前回の get_move の履歴値は半分に減衰）
+        self.killer_moves = [[] for _ in range(64)]
+        for scores in self.history_scores:
+            for column in range(16):
+                scores[column] >>= 1
+    
+    def search(self, board: BitBoard, player: int, max_depth: int) -> Tuple[int, int]:
+        self.quiescence_nodes = 0
+        self.nodes = 0
+        
+        # 反復深化（2回目以降は前回の評価値の周りの狭い窓から始める）
+        # 時間切れの回は SearchTimeout で丸ごと捨て、最後に読み終えた深さの最善手を返す
+        best_move = self.fallback_move(board)
+        scores = []
+        root_length = len(board.history)
+        self.root_ply = root_length
+        # 読み終えた深さごとの (深さ, 節点数, 使った持ち時間の割合)
+        self.iteration_stats = []
+        for depth in range(1, max_depth + 1):
+            if self.is_time_up() or not self.iteration_fits():
                 break
             
-            move, score = self.minimax_with_alpha_beta(board, depth, float('-inf'), float('inf'), True, player)
+            started = self.time_manager.used()
+            nodes_before = self.nodes + self.quiescence_nodes
+            # 評価値は深さの偶奇で揺れるので、窓の中心は2つ前（同じ偶奇）の深さの値にする
+            window = self.ASPIRATION_WINDOW
+            guess = scores[-2] if len(scores) >= 2 else (scores[-1] if scores else 0)
+            if scores and abs(guess) < self.WIN_THRESHOLD:
+                alpha, beta = guess - window, guess + window
+            else:
+                alpha, beta = -self.INFINITY, self.INFINITY
+            try:
+                while True:
+                    move, score = self.negamax(board, depth, alpha, beta)
+                    # 外れた側だけ窓を広げて再探索（広げすぎたら全幅）
+                    window *= 4
+                    if score <= alpha and alpha > -self.INFINITY:
+                        alpha = score - window if window < self.WIN_THRESHOLD else -self.INFINITY
+                    elif score >= beta and beta < self.INFINITY:
+                        beta = score + window if window < self.WIN_THRESHOLD else self.INFINITY
+                    else:
+                        break
+            except SearchTimeout:
+                board.unwind(root_length)
+                break
             if move:
                 best_move = move
+            scores.append(score)
+            self.iteration_stats.append((depth, self.nodes + self.quiescence_nodes - nodes_before,
+                                         self.time_manager.used() - started))
+            # 勝ち・負けが証明されたらそれ以上深く読んでも手順の長さは変わらない
+            if abs(score) >= self.WIN_THRESHOLD:
+                break
         
-        return best_move if best_move else (1, 1)
+        return best_move
     
-    def find_immediate_win(self, board: Board, player: int) -> Optional[Tuple[int, int]]:
-        for x in range(4):
-            for y in range(4):
-                if self.game_engine.is_valid_move(board, x, y):
-                    test_board = self.game_engine.make_move(board, x, y, player)
-                    if self.game_engine.is_winning_position(test_board, player):
-                        return (x, y)
-        return None
+    def iteration_fits(self) -> bool:
+        # 前回の反復の時間 × 実効分岐係数で次の反復の時間を見積もり、持ち時間内に終わりそうか
+        stats = self.iteration_stats
+        if len(stats) < 2:
+            return True
+        branching = stats[-1][1] / max(stats[-2][1], 1)
+        if len(stats) >= 3:
+            # 深さの偶奇で節点数が揺れるので、2回分の比の幾何平均をとる
+            branching = (stats[-1][1] / max(stats[-3][1], 1)) ** 0.5
+        return self.time_manager.used() + stats[-1][2] * max(branching, 1.0) <= 1.0
     
-    def minimax_with_alpha_beta(self, board: Board, depth: int, alpha: float, beta: float, 
-                               maximizing_player: bool, original_player: int) -> Tuple[Optional[Tuple[int, int]], int]:
-        
-        if self.is_time_up():
-            return None, self.game_engine.evaluate_position(board, original_player)
+    def fallback_move(self, board: BitBoard) -> Tuple[int, int]:
+        # 1回目の反復も読み終えられなかったときの手（前回の探索の最善手、なければ並べ替えの先頭）
+        moves = self.game_engine.get_forcing_moves(board)
+        if self.excluded_root_moves:
+            moves = [move for move in moves if move not in self.excluded_root_moves] or moves
+        tt_result = self.transposition_table.lookup(board)
+        tt_move = tt_result[3] if tt_result else None
+        return self.order_moves(board, moves, tt_move)[0]
+    
+    def cell_to_move(self, cells: int) -> Tuple[int, int]:
+        # ビット集合の最下位マスを (x, y) に変換
+        column = ((cells & -cells).bit_length() - 1) & 15
+        return (column & 3, column >> 2)
+    
+    def negamax(self, board: BitBoard, depth: int, alpha: int, beta: int) -> Tuple[Optional[Tuple[int, int]], int]:
+        # 手番側から見た評価値を返す Principal Variation Search
+        self.nodes += 1
+        if self.nodes & (self.TIME_CHECK_INTERVAL - 1) == 0 and self.is_time_up():
+            raise SearchTimeout()
+        ply = len(board.history) - self.root_ply
         
-        # Transposition Table lookup
-        tt_result = self.transposition_table.lookup(board, depth)
+        # Transposition Table lookup（ルートでは打ち切らない）
+        tt_result = self.transposition_table.lookup(board)
+        tt_move = None
         if tt_result:
-            score, flag, best_move = tt_result
-            if flag == 'EXACT':
-                return best_move, score
-            elif flag == 'LOWERBOUND' and score >= beta:
-                return best_move, score
-            elif flag == 'UPPERBOUND' and score <= alpha:
-                return best_move, score
+            stored_depth, score, flag, tt_move = tt_result
+            score = self.from_table_score(score, ply)
+            if ply and not self.verifying and stored_depth >= depth:
+                if flag == 'EXACT':
+                    return tt_move, score
+                elif flag == 'LOWERBOUND' and score >= beta:
+                    return tt_move, score
+                elif flag == 'UPPERBOUND' and score <= alpha:
+                    return tt_move, score
         
-        if depth == 0 or self.game_engine.is_board_full(board):
-            score = self.game_engine.evaluate_position(board, original_player)
-            return None, score
+        # 直前の手（相手側）で勝負がついているか
+        if board.last_move_wins():
+            return None, ply - self.MATE_SCORE
         
-        current_player = original_player if maximizing_player else (3 - original_player)
+        if self.game_engine.is_board_full(board):
+            return None, self.game_engine.evaluate_position(board, board.player)
+        if depth == 0:
+            return None, self.quiescence(board, depth)
         
-        if self.game_engine.is_winning_position(board, current_player):
-            score = 10000 - (10 - depth)
-            return None, score if maximizing_player else -score
+        # 手数による枝刈り（これより早く勝つ・遅く負けることはない）
+        alpha = max(alpha, ply - self.MATE_SCORE)
+        beta = min(beta, self.MATE_SCORE - ply - 1)
+        if alpha >= beta:
+            return None, alpha
         
-        valid_moves = self.game_engine.get_valid_moves(board)
+        threats = board.threat_map()
+        valid_moves = self.game_engine.get_forcing_moves(board, threats)
+        if not ply and self.excluded_root_moves:
+            valid_moves = [move for move in valid_moves if move not in self.excluded_root_moves] or valid_moves
+        valid_moves = self.order_moves(board, valid_moves, tt_move, threats)
         best_move = None
+        best_score = -self.INFINITY
         original_alpha = alpha
         
-        if maximizing_player:
-            max_eval = float('-inf')
-            for x, y in valid_moves:
-                new_board = self.game_engine.make_move(board, x, y, current_player)
-                _, eval_score = self.minimax_with_alpha_beta(new_board, depth - 1, alpha, beta, False, original_player)
-                
-                if eval_score > max_eval:
-                    max_eval = eval_score
-                    best_move = (x, y)
-                
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    break
-            
-            # Transposition Table store
-            flag = 'EXACT'
-            if max_eval <= original_alpha:
-                flag = 'UPPERBOUND'
-            elif max_eval >= beta:
-                flag = 'LOWERBOUND'
-            
-            self.transposition_table.store(board, depth, max_eval, flag, best_move)
-            return best_move, max_eval
-        else:
-            min_eval = float('inf')
-            for x, y in valid_moves:
-                new_board = self.game_engine.make_move(board, x, y, current_player)
-                _, eval_score = self.minimax_with_alpha_beta(new_board, depth - 1, alpha, beta, True, original_player)
-                
-                if eval_score < min_eval:
-                    min_eval = eval_score
-                    best_move = (x, y)
-                
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    break
+        for index, (x, y) in enumerate(valid_moves):
+            reduction = self.late_move_reduction(board, (x, y), index, depth, tt_move)
+            board.push(x, y)
+            if best_move is None:
+                _, score = self.negamax(board, depth - 1, -beta, -alpha)
+                score = -score
+            else:
+                # 2手目以降はゼロ幅窓で調べ、α を超えたときだけ全幅で再探索
+                # （順位の低い手は浅く読み、α を超えたら元の深さで読み直す）
+                score = -self.INFINITY
+                if reduction:
+                    _, score = self.negamax(board, depth - 1 - reduction, -alpha - 1, -alpha)
+                    score = -score
+                if not reduction or score > alpha:
+                    _, score = self.negamax(board, depth - 1, -alpha - 1, -alpha)
+                    score = -score
+                if alpha < score < beta:
+                    _, score = self.negamax(board, depth - 1, -beta, -alpha)
+                    score = -score
+            board.pop()
             
-            # Transposition Table store
-            flag = 'EXACT'
-            if min_eval <= original_alpha:
-                flag = 'UPPERBOUND'
-            elif min_eval >= beta:
-                flag = 'LOWERBOUND'
+            if score > best_score:
+                best_score = score
+                best_move = (x, y)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.record_cutoff(board, (x, y), depth)
+                break
+        
+        # Transposition Table store（手番側から見た上限・下限）
+        flag = 'EXACT'
+        if best_score <= original_alpha:
+            flag = 'UPPERBOUND'
+        elif best_score >= beta:
+            flag = 'LOWERBOUND'
+        
+        if not self.verifying:
+            self.transposition_table.store(board, depth, self.to_table_score(best_score, ply), flag, best_move)
+        return best_move, best_score
+    
+    def to_table_score(self, score: int, ply: int) -> int:
+        # 勝ち負けの手数をルートからではなくその局面からの手数に直して置換表に保存
+        if score >= self.WIN_THRESHOLD:
+            return score + ply
+        if score <= -self.WIN_THRESHOLD:
+            return score - ply
+        return score
+    
+    def from_table_score(self, score: int, ply: int) -> int:
+        if score >= self.WIN_THRESHOLD:
+            return score - ply
+        if score <= -self.WIN_THRESHOLD:
+            return score + ply
+        return score
+    
+    def late_move_reduction(self, board: BitBoard, move: Tuple[int, int], index: int, depth: int,
+                            tt_move: Optional[Tuple[int, int]]) -> int:
+        # 並べ替えで後ろに回った静かな手を何手浅く読むか（脅威を作る手・受けの手は減らさない）
+        if depth < self.LMR_MIN_DEPTH or index < self.LMR_MIN_MOVES or move == tt_move:
+            return 0
+        if move in self.killer_moves[len(board.history)]:
+            return 0
+        column = move[0] + 4 * move[1]
+        cell = column + 16 * board.heights[column]
+        opponent = 3 - board.player
+        if (board.creates_three(cell, board.player) or board.creates_three(cell, opponent)
+                or board.completes_line(cell, opponent)):
+            return 0
+        if depth >= self.LMR_MIN_DEPTH + 2 and index >= 2 * self.LMR_MIN_MOVES:
+            return 2
+        return 1
+    
+    def order_moves(self, board: BitBoard, moves: List[Tuple[int, int]], tt_move: Optional[Tuple[int, int]],
+                    threats: Optional[Tuple[int, List[int], List[int]]] = None) -> List[Tuple[int, int]]:
+        # 置換表の最善手 → 新しい脅威を作る手 → キラー手 → 履歴値の順（同点は中心優先の元の順）
+        # 相手のまだ置けない勝ちマスの真下を埋める手は、相手に勝ちマスを渡すので最後に回す
+        if len(moves) <= 1:
+            return moves
+        player = board.player
+        _, _, future = threats or board.threat_map()
+        opponent_future = future[3 - player]
+        killers = self.killer_moves[len(board.history)]
+        history = self.history_scores[player]
+        heights = board.heights
+        keys = {}
+        for x, y in moves:
+            column = x + 4 * y
+            cell = column + 16 * heights[column]
+            if (x, y) == tt_move:
+                keys[(x, y)] = 1 << 30
+            elif opponent_future >> (cell + 16) & 1:
+                keys[(x, y)] = -(1 << 28) + history[column]
+            elif board.creates_three(cell, player):
+                keys[(x, y)] = (1 << 28) + history[column]
+            elif (x, y) in killers:
+                keys[(x, y)] = 1 << 26
+            else:
+                keys[(x, y)] = history[column]
+        return sorted(moves, key=keys.__getitem__, reverse=True)
+    
+    def record_cutoff(self, board: BitBoard, move: Tuple[int, int], depth: int):
+        # βカットを起こした手をキラー手・履歴値に記録
+        killers = self.killer_moves[len(board.history)]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history_scores[board.player][move[0] + 4 * move[1]] += depth * depth
+    
+    def quiescence(self, board: BitBoard, depth: int) -> int:
+        # 探索の末端で、即勝ちと受けが必須の手だけを読み進めてから静的評価する（手番側から見た値）
+        self.quiescence_nodes += 1
+        if self.quiescence_nodes & (self.TIME_CHECK_INTERVAL - 1) == 0 and self.is_time_up():
+            raise SearchTimeout()
+        ply = len(board.history) - self.root_ply
+        if board.last_move_wins():
+            return ply - self.MATE_SCORE
+        
+        stand_pat = self.game_engine.evaluate_position(board, board.player)
+        if (self.quiescence_nodes > self.quiescence_node_limit or depth <= -self.quiescence_max_depth
+                or self.game_engine.is_board_full(board)):
+            return stand_pat
+        
+        playable = board.playable_cells()
+        wins = board.threat_cells(board.player) & playable
+        if wins:
+            # 手番側が次の手で勝つ
+            return self.MATE_SCORE - (ply + 1)
+        
+        blocks = board.threat_cells(3 - board.player) & playable
+        if not blocks:
+            return stand_pat
+        if blocks & (blocks - 1):
+            # 受けきれない（相手の勝ちマスが2つ以上）
+            return (ply + 2) - self.MATE_SCORE
+        
+        x, y = self.cell_to_move(blocks)
+        board.push(x, y)
+        score = -self.quiescence(board, depth - 1)
+        board.pop()
+        return score
+    
+    def is_time_up(self) -> bool:
+        return self.time_manager.is_time_up()
+
+class MCTSNode:
+    # MCTS の木の節点（wins は直前に指した側 mover から見た勝ち数、引き分けは 0.5）
+    __slots__ = ('move', 'mover', 'parent', 'children', 'untried', 'visits', 'wins', 'terminal')
+    
+    def __init__(self, move: Optional[Tuple[int, int]], mover: int, parent: Optional['MCTSNode']):
+        self.move = move
+        self.mover = mover
+        self.parent = parent
+        self.children = []
+        # 未展開の手（None はまだ生成していない）
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+        # 終局節点なら勝者（mover）か 0（引き分け）
+        self.terminal = None
+
+class MCTSAI(Alg3D):
+    # UCB1 で木を伸ばし、勝ち・受けだけ優先するランダムプレイアウトで評価するモンテカルロ木探索
+    EXPLORATION = 1.4
+    
+    def __init__(self, max_nodes: int = 300000, seed: Optional[int] = None):
+        self.game_engine = GameEngine()
+        self.max_nodes = max_nodes
+        self.random = random.Random(seed)
+        # 前回選んだ手の節点と、その手を指した後の石の配置（相手の応手をたどって木を再利用する）
+        self.root = None
+        self.root_stones = None
+        self.node_count = 0
+        self.iterations = 0
+        self.time_manager = TimeManager()
+    
+    def get_move(
+        self,
+        board: List[List[List[int]]],
+        player: int,
+        last_move: Tuple[int, int, int]
+    ) -> Tuple[int, int]:
+        board = BitBoard.from_board(board, player)
+        self.time_manager.start(board)
+        
+        # 即座勝利チェック・脅威ブロック
+        opponent = 3 - player
+        _, immediate, _ = board.threat_map()
+        if immediate[player]:
+            return self.cell_to_move(immediate[player])
+        if immediate[opponent]:
+            return self.cell_to_move(immediate[opponent])
+        
+        # 時間いっぱい木を伸ばし、最も訪問回数の多い手を選ぶ
+        root = self.reuse_tree(board, last_move)
+        self.iterations = 0
+        while not self.is_time_up():
+            self.iterate(board, root)
+            self.iterations += 1
+        
+        if not root.children:
+            return self.game_engine.get_valid_moves(board)[0]
+        best = max(root.children, key=lambda child: child.visits)
+        board.push(*best.move)
+        self.root = best
+        self.root_stones = (board.stones[1], board.stones[2])
+        board.pop()
+        return best.move
+    
+    def reuse_tree(self, board: BitBoard, last_move: Tuple[int, int, int]) -> MCTSNode:
+        # 前回の木に相手の応手の節点があり、盤面も一致すればその部分木を新しいルートにする
+        if self.root is not None and last_move and None not in last_move:
+            x, y, z = last_move
+            bit = 1 << BitBoard.bit_index(x, y, z)
+            expected = [0, self.root_stones[0], self.root_stones[1]]
+            expected[3 - board.player] |= bit
+            if expected == board.stones:
+                for child in self.root.children:
+                    if child.move == (x, y):
+                        child.parent = None
+                        self.node_count = child.visits
+                        return child
+        self.node_count = 1
+        return MCTSNode(None, 3 - board.player, None)
+    
+    def iterate(self, board: BitBoard, root: MCTSNode):
+        # 選択 → 展開 → プレイアウト → 逆伝播 を1回行う
+        node = root
+        pushed = 0
+        while node.terminal is None and node.children and (not node.untried or self.node_count >= self.max_nodes):
+            node = self.select_child(node)
+            board.push(*node.move)
+            pushed += 1
+        
+        if node.terminal is None:
+            if node.untried is None:
+                # 勝ちマス・受けのマスがあればその手だけを展開する（中心寄りの手から）
+                node.untried = self.game_engine.get_forcing_moves(board)[::-1]
+            if node.untried and self.node_count < self.max_nodes:
+                move = node.untried.pop()
+                board.push(*move)
+                pushed += 1
+                child = MCTSNode(move, 3 - board.player, node)
+                if board.last_move_wins():
+                    child.terminal = child.mover
+                elif self.game_engine.is_board_full(board):
+                    child.terminal = 0
+                node.children.append(child)
+                self.node_count += 1
+                node = child
+        
+        winner = node.terminal if node.terminal is not None else self.rollout(board)
+        while node is not None:
+            node.visits += 1
+            if winner == node.mover:
+                node.wins += 1.0
+            elif winner == 0:
+                node.wins += 0.5
+            node = node.parent
+        for _ in range(pushed):
+            board.pop()
+    
+    def select_child(self, node: MCTSNode) -> MCTSNode:
+        # UCB1: 勝率 + C * sqrt(ln N / n)
+        log_visits = math.log(node.visits)
+        exploration = self.EXPLORATION
+        best = None
+        best_value = -1.0
+        for child in node.children:
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best_value = value
+                best = child
+        return best
+    
+    def rollout(self, board: BitBoard) -> int:
+        # ビット演算だけで終局まで打ち、勝者（引き分けは 0）を返す
+        # 勝てるマスがあれば勝ち、相手の勝ちマスがあれば受け、それ以外はランダムな列に置く
+        stones = [0, board.stones[1], board.stones[2]]
+        occupied = stones[1] | stones[2]
+        heights = board.heights[:]
+        open_columns = [column for column in range(16) if heights[column] < 4]
+        threats = [0, board.threat_cells(1), board.threat_cells(2)]
+        player = board.player
+        choice = self.random.choice
+        while open_columns:
+            opponent = 3 - player
+            playable = ((occupied << 16) | 0xFFFF) & ~occupied
+            if threats[player] & playable:
+                return player
+            blocks = threats[opponent] & playable
+            if blocks:
+                if blocks & (blocks - 1):
+                    # 受けきれない
+                    return opponent
+                cell = blocks.bit_length() - 1
+                column = cell & 15
+            else:
+                column = choice(open_columns)
+                cell = column + 16 * heights[column]
             
-            self.transposition_table.store(board, depth, min_eval, flag, best_move)
-            return best_move, min_eval
+            bit = 1 << cell
+            stones[player] |= bit
+            occupied |= bit
+            heights[column] += 1
+            if heights[column] == 4:
+                open_columns.remove(column)
+            # 置いたマスを通るラインだけ、相手の石がなく自分の石が3つになったら残りのマスを勝ちマスに加える
+            mine = stones[player]
+            theirs = stones[opponent]
+            for line, _ in CELL_LINES[cell]:
+                mask = LINE_MASKS[line]
+                if not theirs & mask:
+                    rest = mask & ~mine
+                    if rest & (rest - 1) == 0:
+                        threats[player] |= rest
+            player = opponent
+        return 0
+    
+    def cell_to_move(self, cells: int) -> Tuple[int, int]:
+        column = ((cells & -cells).bit_length() - 1) & 15
+        return (column & 3, column >> 2)
     
     def is_time_up(self) -> bool:
-        return time.time() - self.start_time > self.time_limit
\ No newline at end of file
+        return self.time_manager.is_time_up()
+
+class MyAI(MinimaxAI):
+    pass
@@ -0,0 +1,147 @@
+# === opening_book_generator.py ===
+# main.py に埋め込む定跡データ（OPENING_BOOK_DATA）を手元のマシンで生成するツール。
+# サーバでは実行しない（multiprocessing やファイル入出力を使うため）。
+#
+# 使い方:
+#   python opening_book_generator.py --plies 3 --depth 8 --workers 8 --update-main
+#
+# 空盤面から --plies 手目までの全局面を展開し、8対称で同一の局面は1つにまとめ、
+# 各局面を MyAI の探索で --depth まで読んだ最善手を記録する。途中経過は
+# --checkpoint に保存されるので、中断しても同じコマンドで続きから再開できる。
+# 定跡のキーは main.py の Zobrist 乱数表に依存するため、乱数のシードや対称変換の
+# 定義を変えたら定跡も作り直すこと。
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import local_driver
+
+MAIN_PATH = "main.py"
+
+_worker_module = None
+
+def load_main(path: str = MAIN_PATH):
+    # main.py は本番用に framework を import するので、ローカルでは local_driver で代用する
+    sys.modules.setdefault("framework", local_driver)
+    spec = importlib.util.spec_from_file_location("student_ai", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def init_worker(path: str):
+    global _worker_module
+    _worker_module = load_main(path)
+
+def search_position(task: Tuple[int, int, int, int]) -> Tuple[int, int, float]:
+    # (黒石, 白石, 手番, 探索深さ) → (正規化キー, 正規化した向きの列番号, 所要秒数)
+    black, white, player, depth = task
+    module = _worker_module
+    board = module.BitBoard(black, white, player)
+    ai = module.MyAI()
+    # 手元での生成なので時間制限は外す
+    ai.time_manager = module.TimeManager(cpu_limit=float("inf"), wall_limit=float("inf"))
+    ai.time_manager.start(board)
+    ai.begin_search()
+
+    started = time.time()
+    move = ai.search(board, player, depth)
+    if move is None:
+        move = module.GameEngine().get_valid_moves(board)[0]
+    key, symmetry = board.canonical_key()
+    column = module.SYMMETRIES[symmetry][move[0] + 4 * move[1]]
+    return key, column, time.time() - started
+
+def expand_positions(module, plies: int) -> List[Tuple[int, int, int]]:
+    # 空盤面から plies 手目までの局面を対称性で重複除去して列挙（勝負がついた局面は除く）
+    engine = module.GameEngine()
+    positions = []
+    seen = set()
+    frontier = [module.BitBoard()]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for board in frontier:
+            key, _ = board.canonical_key()
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append((board.stones[1], board.stones[2], board.player))
+            if ply == plies:
+                continue
+            for x, y in engine.get_valid_moves(board):
+                board.push(x, y)
+                if not board.last_move_wins():
+                    next_frontier.append(module.BitBoard(board.stones[1], board.stones[2], board.player))
+                board.pop()
+        frontier = next_frontier
+    return positions
+
+def load_checkpoint(path: str, depth: int) -> Dict[int, int]:
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if checkpoint.get("depth") != depth:
+        print(f"checkpoint の探索深さ({checkpoint.get('depth')})が異なるため作り直します")
+        return {}
+    return {int(key): column for key, column in checkpoint["entries"].items()}
+
+def save_checkpoint(path: str, depth: int, entries: Dict[int, int]):
+    with open(path, "w") as f:
+        json.dump({"depth": depth, "entries": {str(key): column for key, column in entries.items()}}, f)
+
+def format_literal(data: str, width: int = 76) -> str:
+    lines = [f"    '{data[i:i + width]}'" for i in range(0, len(data), width)] or ["    ''"]
+    return "OPENING_BOOK_DATA = (\n" + "\n".join(lines) + "\n)"
+
+def update_main(path: str, literal: str, max_stones: int):
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    source = re.sub(r"OPENING_BOOK_DATA = \(\n.*?\n\)", lambda _: literal, source, count=1, flags=re.S)
+    source = re.sub(r"(def __init__\(self, data: str = OPENING_BOOK_DATA, max_stones: int = )\d+",
+                    lambda match: match.group(1) + str(max_stones), source, count=1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="main.py 用の定跡データを生成する")
+    parser.add_argument("--plies", type=int, default=3, help="定跡に含める最大の石数")
+    parser.add_argument("--depth", type=int, default=8, help="各局面の探索深さ")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--checkpoint", default="opening_book_checkpoint.json")
+    parser.add_argument("--main", default=MAIN_PATH, help="探索に使う main.py")
+    parser.add_argument("--update-main", action="store_true", help="main.py の OPENING_BOOK_DATA を書き換える")
+    args = parser.parse_args(argv)
+
+    module = load_main(args.main)
+    positions = expand_positions(module, args.plies)
+    entries = load_checkpoint(args.checkpoint, args.depth)
+
+    tasks = []
+    for black, white, player in positions:
+        key, _ = module.BitBoard(black, white, player).canonical_key()
+        if key not in entries:
+            tasks.append((black, white, player, args.depth))
+    print(f"局面数 {len(positions)}（探索済み {len(positions) - len(tasks)}、残り {len(tasks)}）")
+
+    started = time.time()
+    with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.main,)) as pool:
+        for done, (key, column, seconds) in enumerate(pool.imap_unordered(search_position, tasks), 1):
+            entries[key] = column
+            save_checkpoint(args.checkpoint, args.depth, entries)
+            print(f"[{done}/{len(tasks)}] {seconds:.1f}s（経過 {time.time() - started:.0f}s）")
+
+    literal = format_literal(module.OpeningBook.encode(entries))
+    if args.update_main:
+        update_main(args.main, literal, args.plies)
+        print(f"{args.main} を更新しました（{len(entries)} 局面）")
+    else:
+        print(literal)
+
+if __name__ == "__main__":
+    main()